@@ -2,9 +2,8 @@ import numpy as np
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtWidgets, QtCore
 from PySide6.QtGui import QPalette, QColor
-from pylsl import StreamInlet, resolve_byprop
+from pylsl import StreamInlet, resolve_byprop, cf_float32, cf_double64, cf_int32, cf_int16
 import sys
-import csv
 import time
 
 class LSLTimeScope(QtWidgets.QMainWindow):
@@ -16,6 +15,7 @@ class LSLTimeScope(QtWidgets.QMainWindow):
         self.SAMPLING_RATE = 250
         self.TIME_WINDOW = 10 
         self.AMPLITUDE_SCALE = 100 
+        self.CHUNK = 256 # Max samples pulled from LSL per call
 
         # --- LSL SETUP ---
         print("Resolving LSL stream...")
@@ -27,13 +27,24 @@ class LSLTimeScope(QtWidgets.QMainWindow):
         self.inlet = StreamInlet(streams[0])
         info = self.inlet.info()
         self.CHANNEL_COUNT = info.channel_count()
+
+        # pull_chunk writes raw stream values, so the chunk dtype must match the stream.
+        # The ring buffer stays float32 unless the stream is float64; integer streams
+        # get converted once per chunk when copied into the ring. Formats without a dtype
+        # here fall back to the list-returning pull_chunk.
+        lsl_dtypes = {cf_float32: np.float32, cf_double64: np.float64, cf_int32: np.int32, cf_int16: np.int16}
+        channel_format = info.channel_format()
+        self.CHUNK_DTYPE = lsl_dtypes.get(channel_format)
+        self.BUFFER_DTYPE = np.float64 if channel_format == cf_double64 else np.float32
         
         # --- RECORDING & PRINT STATE ---
         self.is_recording = False
         self.csv_file = None
-        self.csv_writer = None
         self.start_lsl_time = None 
         self.print_counter = 0 # To control terminal scroll speed
+        self._ch_header = " | ".join(f"{f'CH{i+1}':>7}" for i in range(self.CHANNEL_COUNT))
+        self._live_format = {"float_kind": lambda x: f"{x:7.2f}", "int": lambda x: f"{x:7d}"}
+        print(f"[LIVE] {self._ch_header}")
 
         # --- GUI LAYOUT ---
         self.central_widget = QtWidgets.QWidget()
@@ -56,10 +67,21 @@ class LSLTimeScope(QtWidgets.QMainWindow):
 
         self.MAX_POINTS = self.SAMPLING_RATE * self.TIME_WINDOW 
         self.t_vec = np.arange(self.MAX_POINTS) / self.SAMPLING_RATE
-        self.data_buffer = np.zeros((self.MAX_POINTS, self.CHANNEL_COUNT))
+        # Channels-first (SoA) so each curve reads one contiguous row
+        self.data_buffer = np.zeros((self.CHANNEL_COUNT, self.MAX_POINTS), dtype=self.BUFFER_DTYPE)
         self.sample_index = 0
+        self.DECIMATION = 5
+        self.t_dec = self.t_vec[::self.DECIMATION].astype(self.BUFFER_DTYPE)
+        self.offsets = np.arange(self.CHANNEL_COUNT - 0.5, 0.0, -1.0, dtype=self.BUFFER_DTYPE)[:, None]
+        # pylsl writes straight into this buffer, no intermediate Python lists
+        self._chunk_buf = None
+        if self.CHUNK_DTYPE is not None:
+            self._chunk_buf = np.empty((self.CHUNK, self.CHANNEL_COUNT), dtype=self.CHUNK_DTYPE)
+
+        self._last_plot_block = 0
 
         self.timer = QtCore.QTimer()
+        self.timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
         self.timer.timeout.connect(self.update_all)
         self.timer.start(40) 
 
@@ -69,8 +91,12 @@ class LSLTimeScope(QtWidgets.QMainWindow):
         self.plot_item = self.plot_widget.getPlotItem()
         self.plot_item.setYRange(0, self.CHANNEL_COUNT)
         self.plot_item.setXRange(0, self.TIME_WINDOW)
-        self.curves = [self.plot_item.plot(pen=pg.mkPen(QColor(palette.color(QPalette.ColorRole.WindowText)), width=1)) 
+        pen = pg.mkPen(QColor(palette.color(QPalette.ColorRole.WindowText)), width=1)
+        # Bare curve items: amplifier data is always finite, so skip the per-refresh isfinite scan
+        self.curves = [pg.PlotCurveItem(pen=pen, skipFiniteCheck=True, connect='all')
                        for _ in range(self.CHANNEL_COUNT)]
+        for curve in self.curves:
+            self.plot_item.addItem(curve)
 
     def toggle_recording(self):
         if self.record_btn.isChecked():
@@ -80,10 +106,10 @@ class LSLTimeScope(QtWidgets.QMainWindow):
             self.record_btn.setStyleSheet("background-color : #ff4c4c; color: white; font-weight: bold; height: 50px;")
             
             filename = f"EEG_Capture_{time.strftime('%Y%m%d-%H%M%S')}.csv"
-            self.csv_file = open(filename, mode='w', newline='')
-            self.csv_writer = csv.writer(self.csv_file)
+            # Large userspace buffer so each chunk is one write, not one syscall per row
+            self.csv_file = open(filename, mode='wb', buffering=1 << 20)
             header = ['Time_Seconds'] + [f'CH{i+1}' for i in range(self.CHANNEL_COUNT)]
-            self.csv_writer.writerow(header)
+            self.csv_file.write((",".join(header) + "\n").encode())
             self.status_bar.showMessage(f"Recording to: {filename}")
         else:
             self.stop_recording_logic()
@@ -93,40 +119,70 @@ class LSLTimeScope(QtWidgets.QMainWindow):
         self.record_btn.setText("Start Recording")
         self.record_btn.setStyleSheet("background-color : #4CAF50; color: white; font-weight: bold; height: 50px;")
         if self.csv_file:
+            self.csv_file.flush()
             self.csv_file.close()
             self.csv_file = None
             self.status_bar.showMessage("File Saved Successfully")
 
     def update_all(self):
         while True:
-            sample, timestamp = self.inlet.pull_sample(timeout=0.0)
-            if sample is None:
+            if self._chunk_buf is not None:
+                samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.CHUNK, dest_obj=self._chunk_buf)
+            else:
+                samples, timestamps = self.inlet.pull_chunk(timeout=0.0, max_samples=self.CHUNK)
+            n = len(timestamps)
+            if n == 0:
                 break
-            
+            if self._chunk_buf is not None:
+                chunk = self._chunk_buf[:n]
+            else:
+                chunk = np.asarray(samples, dtype=self.BUFFER_DTYPE)
+
             # --- TERMINAL PRINTING LOGIC ---
             # Only print every 25th sample (~10 times per second) so it's readable
-            self.print_counter += 1
-            if self.print_counter % 25 == 0:
-                # Create a string: "CH1: 12.3 | CH2: -5.4 | ..."
-                print_str = " | ".join([f"CH{i+1}: {val:7.2f}" for i, val in enumerate(sample)])
-                print(f"[LIVE] {print_str}")
+            # Rows line up under the channel header printed once in __init__
+            for sample in chunk[(24 - self.print_counter) % 25::25]:
+                print_str = np.array2string(sample, formatter=self._live_format, separator=" | ", max_line_width=1 << 16)
+                print(f"[LIVE] {print_str[1:-1]}")
+            self.print_counter += n
 
             # --- CSV LOGGING ---
             if self.is_recording:
+                ts = np.asarray(timestamps)
                 if self.start_lsl_time is None:
-                    self.start_lsl_time = timestamp
-                self.csv_writer.writerow([f"{(timestamp - self.start_lsl_time):.4f}"] + sample)
+                    self.start_lsl_time = ts[0]
+                rows = np.empty((n, 1 + self.CHANNEL_COUNT))
+                rows[:, 0] = ts - self.start_lsl_time
+                rows[:, 1:] = chunk
+                np.savetxt(self.csv_file, rows, fmt="%.4f", delimiter=",")
 
             # --- DATA BUFFER ---
-            idx = self.sample_index % self.MAX_POINTS
-            self.data_buffer[idx, :] = sample
-            self.sample_index += 1
+            # One wrap-around copy into the ring buffer (at most two slices)
+            start = self.sample_index % self.MAX_POINTS
+            end = start + n
+            if end <= self.MAX_POINTS:
+                self.data_buffer[:, start:end] = chunk.T
+            else:
+                split = self.MAX_POINTS - start
+                self.data_buffer[:, start:] = chunk[:split].T
+                self.data_buffer[:, :end - self.MAX_POINTS] = chunk[split:].T
+            self.sample_index += n
+
+            if n < self.CHUNK:
+                break
 
         # --- PLOT REFRESH ---
-        N = 5 
+        # Skip the redraw until new samples complete another decimation block
+        plot_block = self.sample_index // self.DECIMATION
+        if plot_block == self._last_plot_block:
+            return
+        self._last_plot_block = plot_block
+
+        # Block-mean decimation, scaling and offsets for every channel in one pass
+        blocks = self.data_buffer.reshape(self.CHANNEL_COUNT, -1, self.DECIMATION)
+        scaled = blocks.mean(axis=2, dtype=self.BUFFER_DTYPE) * self.BUFFER_DTYPE(1.0 / self.AMPLITUDE_SCALE) + self.offsets
         for i, curve in enumerate(self.curves):
-            offset = self.CHANNEL_COUNT - i - 0.5
-            curve.setData(self.t_vec[::N], self.data_buffer[::N, i] / self.AMPLITUDE_SCALE + offset)
+            curve.setData(x=self.t_dec, y=scaled[i])
 
     def closeEvent(self, event):
         self.stop_recording_logic()
@@ -1,25 +1,33 @@
 from __future__ import annotations
 
-import csv
 import os
 import sys
 import time
-from collections import deque
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from pathlib import Path
-from threading import Event, Lock
-from typing import Any, Deque
+from threading import Condition, Event
+from typing import Any, TextIO
 
 import numpy as np
 
+try:
+    import numba
+except ModuleNotFoundError:
+    numba = None
+
 ROOT_DIR = Path(__file__).resolve().parents[3]
 LOCAL_GPYPE_DIR = ROOT_DIR / "libs" / "gpype"
 os.environ.setdefault("GPYPE_SETTINGS_DIR", str(ROOT_DIR / ".gpype"))
 if LOCAL_GPYPE_DIR.exists() and str(LOCAL_GPYPE_DIR) not in sys.path:
     sys.path.insert(0, str(LOCAL_GPYPE_DIR))
 
+_METRICS_FLUSH_ROWS = 64
+_METRICS_FLUSH_INTERVAL_S = 1.0
+_METRICS_CSV_HEADER = "timestamp_unix_seconds,alpha_power,theta_power,alpha_theta_ratio,concentration_score\n"
+_METRICS_CSV_ROW = "%.6f,%.10f,%.10f,%.10f,%.6f\n"
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class ConcentrationMetric:
     timestamp_unix_seconds: float
     alpha_power: float
@@ -64,6 +72,41 @@ class EEGConfig:
     history_size: int = 2048
 
 
+def _band_powers_numpy(amplitude: np.ndarray, a_lo: int, a_hi: int, t_lo: int, t_hi: int) -> tuple[float, float]:
+    alpha_band: np.ndarray = amplitude[a_lo:a_hi]
+    theta_band: np.ndarray = amplitude[t_lo:t_hi]
+    alpha_power: float = float(np.einsum("ij,ij->", alpha_band, alpha_band)) / alpha_band.size
+    theta_power: float = float(np.einsum("ij,ij->", theta_band, theta_band)) / theta_band.size
+    return alpha_power, theta_power
+
+
+def _band_powers_loop(amplitude: np.ndarray, a_lo: int, a_hi: int, t_lo: int, t_hi: int) -> tuple[float, float]:
+    channels = amplitude.shape[1]
+    alpha_sum = 0.0
+    theta_sum = 0.0
+    for i in range(min(a_lo, t_lo), max(a_hi, t_hi)):
+        in_alpha = a_lo <= i < a_hi
+        in_theta = t_lo <= i < t_hi
+        if not (in_alpha or in_theta):
+            continue
+        row_sum = 0.0
+        for j in range(channels):
+            value = float(amplitude[i, j])
+            row_sum += value * value
+        if in_alpha:
+            alpha_sum += row_sum
+        if in_theta:
+            theta_sum += row_sum
+    return alpha_sum / ((a_hi - a_lo) * channels), theta_sum / ((t_hi - t_lo) * channels)
+
+
+# The explicit loop only pays off once compiled; without numba the einsum reduction is faster.
+if numba is not None:
+    _compute_bands = numba.njit(cache=True, fastmath=True)(_band_powers_loop)
+else:
+    _compute_bands = _band_powers_numpy
+
+
 def _require_gpype() -> Any:
     try:
         import gpype as gp
@@ -77,6 +120,80 @@ def _require_gpype() -> Any:
         ) from exc
 
 
+def _build_fft_node(gp: Any, window_size: int, overlap: float, window_function: str) -> Any:
+    """A gp.FFT that buffers samples in a ring instead of shifting the whole window per sample."""
+    from scipy import fft as sp_fft
+    from scipy.signal import get_window
+
+    class _FFTNode(gp.FFT):
+        def setup(self, data: dict[str, np.ndarray], port_context_in: dict[str, dict]) -> dict[str, dict]:
+            context_out: dict[str, dict] = super().setup(data, port_context_in)
+            weights: np.ndarray = get_window(window_function, window_size)
+            self._weights: np.ndarray = (weights / np.sum(weights)).astype(np.float32)[:, np.newaxis]
+            # gp.FFT's single-sided scale (2 on the interior bins) times its overall factor of 2.
+            scale: np.ndarray = np.full(window_size // 2 + 1, 4.0, dtype=np.float32)
+            scale[0] = 2.0
+            if window_size % 2 == 0:
+                scale[-1] = 2.0
+            self._amplitude_scale: np.ndarray = scale[:, np.newaxis]
+            self._ring: np.ndarray | None = None
+            self._windowed: np.ndarray | None = None
+            self._write_pos: int = 0
+            return context_out
+
+        def step(self, data: dict[str, np.ndarray]) -> dict[str, np.ndarray] | None:
+            # gp.FFT.setup only accepts a frame size of 1, so each step carries one sample.
+            sample: np.ndarray = next(iter(data.values()))[0]
+            if self._ring is None or self._ring.shape[1] != sample.shape[0]:
+                self._ring = np.zeros((window_size, sample.shape[0]), dtype=np.float32)
+                self._windowed = np.empty_like(self._ring)
+                self._write_pos = 0
+            self._ring[self._write_pos] = sample
+            self._write_pos = (self._write_pos + 1) % window_size
+            if not self.is_decimation_step():
+                return None
+
+            tail: int = window_size - self._write_pos
+            np.multiply(self._ring[self._write_pos :], self._weights[:tail], out=self._windowed[:tail])
+            np.multiply(self._ring[: self._write_pos], self._weights[tail:], out=self._windowed[tail:])
+            amplitude: np.ndarray = np.abs(sp_fft.rfft(self._windowed, axis=0))
+            amplitude *= self._amplitude_scale
+            return {gp.Constants.Defaults.PORT_OUT: amplitude}
+
+    return _FFTNode(window_size=window_size, overlap=overlap, window_function=window_function)
+
+
+def _build_moving_average_node(gp: Any, window_size: int) -> Any:
+    class _MovingAverageNode(gp.MovingAverage):
+        def setup(self, data: dict[str, np.ndarray], port_context_in: dict[str, dict]) -> dict[str, dict]:
+            context_out: dict[str, dict] = super().setup(data, port_context_in)
+            self._window: np.ndarray | None = None
+            self._total: np.ndarray | None = None
+            self._pos: int = 0
+            return context_out
+
+        def step(self, data: dict[str, np.ndarray]) -> dict[str, np.ndarray] | None:
+            block: np.ndarray = next(iter(data.values()))
+            if self._window is None or self._window.shape[1] != block.shape[1]:
+                # Zero state, like gp.MovingAverage's FIR: the average ramps up from zero.
+                self._window = np.zeros((window_size, block.shape[1]))
+                self._total = np.zeros(block.shape[1])
+                self._pos = 0
+            out: np.ndarray = np.empty(block.shape)
+            for i, sample in enumerate(block):
+                self._total += sample - self._window[self._pos]
+                self._window[self._pos] = sample
+                out[i] = self._total
+                self._pos += 1
+                if self._pos == window_size:
+                    # Re-sum once per lap so rounding error in the running total cannot build up.
+                    self._pos = 0
+                    self._total = self._window.sum(axis=0)
+            return {gp.Constants.Defaults.PORT_OUT: (out / window_size).astype(block.dtype, copy=False)}
+
+    return _MovingAverageNode(window_size=window_size)
+
+
 class AlphaThetaMetricSink:
     def __init__(
         self,
@@ -96,16 +213,23 @@ class AlphaThetaMetricSink:
         self._theta_high_hz: float = theta_high_hz
         self._ratio_low: float = ratio_low
         self._ratio_high: float = ratio_high
+        self._inv_ratio_span: float = 1.0 / max(ratio_high - ratio_low, 1e-9)
         self._print_interval_s: float = print_interval_s
-        self._history: Deque[ConcentrationMetric] = deque(maxlen=max(8, history_size))
-        self._lock: Lock = Lock()
-        self._last_print_s: float = 0.0
+        # One row per ConcentrationMetric field; a column is published by bumping _written, so reads are lock-free.
+        self._capacity: int = max(8, history_size)
+        self._columns: np.ndarray = np.zeros((len(fields(ConcentrationMetric)), self._capacity), dtype=np.float64)
+        self._written: int = 0
+        self._new_metric: Condition = Condition()
+        self._last_print_s: float = float("-inf")
         self._freqs_hz: np.ndarray = np.array([], dtype=np.float64)
-        self._alpha_mask: np.ndarray = np.array([], dtype=bool)
-        self._theta_mask: np.ndarray = np.array([], dtype=bool)
+        self._alpha_lo: int = 0
+        self._alpha_hi: int = 0
+        self._theta_lo: int = 0
+        self._theta_hi: int = 0
         self._metrics_csv_path: Path | None = metrics_csv_path
-        self._metrics_file: csv.TextIOWrapper | None = None
-        self._writer: csv.writer | None = None
+        self._metrics_file: TextIO | None = None
+        self._pending_rows: list[str] = []
+        self._last_flush_s: float = float("-inf")
         self.node: Any | None = None
 
     def build_node(self) -> Any:
@@ -119,56 +243,60 @@ class AlphaThetaMetricSink:
                 sampling_rate: float = float(first_context.get(gp.Constants.Keys.SAMPLING_RATE, 250.0))
                 window_size: int = int(first_context.get(gp.Constants.Keys.FRAME_SIZE, 250))
                 sink._freqs_hz = np.fft.rfftfreq(window_size, d=1.0 / sampling_rate)
-                sink._alpha_mask = (sink._freqs_hz >= sink._alpha_low_hz) & (sink._freqs_hz < sink._alpha_high_hz)
-                sink._theta_mask = (sink._freqs_hz >= sink._theta_low_hz) & (sink._freqs_hz < sink._theta_high_hz)
+                alpha_bounds: np.ndarray = np.searchsorted(sink._freqs_hz, [sink._alpha_low_hz, sink._alpha_high_hz])
+                theta_bounds: np.ndarray = np.searchsorted(sink._freqs_hz, [sink._theta_low_hz, sink._theta_high_hz])
+                sink._alpha_lo, sink._alpha_hi = int(alpha_bounds[0]), int(alpha_bounds[1])
+                sink._theta_lo, sink._theta_hi = int(theta_bounds[0]), int(theta_bounds[1])
+                if sink._alpha_hi <= sink._alpha_lo or sink._theta_hi <= sink._theta_lo:
+                    raise ValueError(
+                        "alpha/theta bands contain no FFT bins at "
+                        f"{sampling_rate:g} Hz with a {window_size}-sample window"
+                    )
                 if sink._metrics_csv_path is not None:
                     sink._metrics_csv_path.parent.mkdir(parents=True, exist_ok=True)
                     sink._metrics_file = sink._metrics_csv_path.open("w", newline="", encoding="utf-8")
-                    sink._writer = csv.writer(sink._metrics_file)
-                    sink._writer.writerow(
-                        [
-                            "timestamp_unix_seconds",
-                            "alpha_power",
-                            "theta_power",
-                            "alpha_theta_ratio",
-                            "concentration_score",
-                        ]
-                    )
+                    sink._metrics_file.write(_METRICS_CSV_HEADER)
                 return context_out
 
             def step(self, data: dict[str, np.ndarray]) -> dict[str, np.ndarray] | None:
                 block: np.ndarray = next(iter(data.values()))
                 if block is None or block.size == 0:
                     return None
-                amplitude: np.ndarray = np.asarray(block, dtype=np.float64)
-                power: np.ndarray = np.square(amplitude, dtype=np.float64)
-                alpha_power: float = float(np.mean(power[sink._alpha_mask, :])) if np.any(sink._alpha_mask) else 0.0
-                theta_power: float = float(np.mean(power[sink._theta_mask, :])) if np.any(sink._theta_mask) else 0.0
+                now_unix_s: float = time.time()
+                now_s: float = time.monotonic()
+                # Only non-float frames pay for a conversion copy.
+                amplitude: np.ndarray = block if block.dtype.kind == "f" else np.asarray(block, dtype=np.float32)
+                alpha_power, theta_power = _compute_bands(
+                    amplitude, sink._alpha_lo, sink._alpha_hi, sink._theta_lo, sink._theta_hi
+                )
                 ratio: float = alpha_power / max(theta_power, 1e-12)
-                scaled: float = (ratio - sink._ratio_low) / max(sink._ratio_high - sink._ratio_low, 1e-9)
-                score: float = float(np.clip(100.0 * scaled, 0.0, 100.0))
+                scaled: float = (ratio - sink._ratio_low) * sink._inv_ratio_span
+                score: float = 0.0 if scaled < 0.0 else (100.0 if scaled > 1.0 else 100.0 * scaled)
                 metric: ConcentrationMetric = ConcentrationMetric(
-                    timestamp_unix_seconds=time.time(),
+                    timestamp_unix_seconds=now_unix_s,
                     alpha_power=alpha_power,
                     theta_power=theta_power,
                     alpha_theta_ratio=ratio,
                     concentration_score=score,
                 )
-                with sink._lock:
-                    sink._history.append(metric)
-                if sink._writer is not None:
-                    sink._writer.writerow(
-                        [
-                            f"{metric.timestamp_unix_seconds:.6f}",
-                            f"{metric.alpha_power:.10f}",
-                            f"{metric.theta_power:.10f}",
-                            f"{metric.alpha_theta_ratio:.10f}",
-                            f"{metric.concentration_score:.6f}",
-                        ]
+                sink._append(metric)
+                if sink._metrics_file is not None:
+                    sink._pending_rows.append(
+                        _METRICS_CSV_ROW
+                        % (
+                            metric.timestamp_unix_seconds,
+                            metric.alpha_power,
+                            metric.theta_power,
+                            metric.alpha_theta_ratio,
+                            metric.concentration_score,
+                        )
                     )
-                    if sink._metrics_file is not None:
-                        sink._metrics_file.flush()
-                now_s: float = time.time()
+                    if (
+                        len(sink._pending_rows) >= _METRICS_FLUSH_ROWS
+                        or now_s - sink._last_flush_s >= _METRICS_FLUSH_INTERVAL_S
+                    ):
+                        sink._flush_metrics()
+                        sink._last_flush_s = now_s
                 if now_s - sink._last_print_s >= sink._print_interval_s:
                     print(
                         " | ".join(
@@ -186,20 +314,66 @@ class AlphaThetaMetricSink:
             def stop(self) -> None:
                 super().stop()
                 if sink._metrics_file is not None:
+                    sink._flush_metrics()
+                    os.fsync(sink._metrics_file.fileno())
                     sink._metrics_file.close()
                     sink._metrics_file = None
-                    sink._writer = None
 
         self.node = _SinkNode()
         return self.node
 
+    def _flush_metrics(self) -> None:
+        if self._metrics_file is None:
+            return
+        if self._pending_rows:
+            self._metrics_file.write("".join(self._pending_rows))
+            self._pending_rows.clear()
+        self._metrics_file.flush()
+
+    def _append(self, metric: ConcentrationMetric) -> None:
+        written: int = self._written
+        self._columns[:, written % self._capacity] = (
+            metric.timestamp_unix_seconds,
+            metric.alpha_power,
+            metric.theta_power,
+            metric.alpha_theta_ratio,
+            metric.concentration_score,
+        )
+        self._written = written + 1
+        with self._new_metric:
+            self._new_metric.notify_all()
+
     def latest(self) -> ConcentrationMetric | None:
-        with self._lock:
-            return self._history[-1] if self._history else None
+        written: int = self._written
+        if written == 0:
+            return None
+        return ConcentrationMetric(*self._columns[:, (written - 1) % self._capacity].tolist())
+
+    def metric_count(self) -> int:
+        return self._written
+
+    def wait_for_metric(self, seen: int, timeout: float | None = None) -> int:
+        """Blocks until more than `seen` metrics exist; returns the count to pass as `seen` next time."""
+        with self._new_metric:
+            self._new_metric.wait_for(lambda: self._written > seen, timeout)
+        return self._written
+
+    def history_arrays(self, count: int | None = None) -> np.ndarray:
+        """A (fields, n) copy of the newest metrics, oldest first."""
+        written: int = self._written
+        available: int = min(written, self._capacity)
+        n: int = available if count is None else max(0, min(count, available))
+        start: int = (written - n) % self._capacity
+        if start + n <= self._capacity:
+            out: np.ndarray = self._columns[:, start : start + n].copy()
+        else:
+            out = np.concatenate((self._columns[:, start:], self._columns[:, : start + n - self._capacity]), axis=1)
+        # Drop the oldest entries if the producer lapped into them while we were copying.
+        overwritten: int = n + (self._written - written) - self._capacity
+        return out[:, overwritten:] if overwritten > 0 else out
 
     def history(self) -> list[ConcentrationMetric]:
-        with self._lock:
-            return list(self._history)
+        return [ConcentrationMetric(*row) for row in self.history_arrays().T.tolist()]
 
 
 class EEGRunner:
@@ -245,17 +419,12 @@ class EEGRunner:
         bandpass: Any = gp.Bandpass(f_lo=cfg.bandpass_low_hz, f_hi=cfg.bandpass_high_hz)
         notch50: Any = gp.Bandstop(f_lo=cfg.notch50_low_hz, f_hi=cfg.notch50_high_hz)
         notch60: Any = gp.Bandstop(f_lo=cfg.notch60_low_hz, f_hi=cfg.notch60_high_hz)
-        fft: Any = gp.FFT(
+        fft: Any = _build_fft_node(
+            gp,
             window_size=cfg.fft_window_size,
             overlap=float(cfg.fft_overlap),
             window_function="hamming",
         )
-        alpha_bp: Any = gp.Bandpass(f_lo=cfg.alpha_low_hz, f_hi=cfg.alpha_high_hz)
-        theta_bp: Any = gp.Bandpass(f_lo=cfg.theta_low_hz, f_hi=cfg.theta_high_hz)
-        alpha_pow: Any = gp.Equation("in**2")
-        theta_pow: Any = gp.Equation("in**2")
-        alpha_avg: Any = gp.MovingAverage(window_size=int(cfg.sampling_rate * 0.5))
-        theta_avg: Any = gp.MovingAverage(window_size=int(cfg.sampling_rate * 0.5))
         sink_node: Any = self.metric_sink.build_node()
 
         self.pipeline.connect(source, splitter)
@@ -264,12 +433,6 @@ class EEGRunner:
         self.pipeline.connect(notch50, notch60)
         self.pipeline.connect(notch60, fft)
         self.pipeline.connect(fft, sink_node)
-        self.pipeline.connect(notch60, alpha_bp)
-        self.pipeline.connect(notch60, theta_bp)
-        self.pipeline.connect(alpha_bp, alpha_pow)
-        self.pipeline.connect(theta_bp, theta_pow)
-        self.pipeline.connect(alpha_pow, alpha_avg)
-        self.pipeline.connect(theta_pow, theta_avg)
 
         if cfg.enable_lsl:
             sender: Any = gp.LSLSender(stream_name=cfg.lsl_stream_name, stype=cfg.lsl_stream_type)
@@ -278,6 +441,18 @@ class EEGRunner:
             writer: Any = gp.CsvWriter(file_name=cfg.csv_file)
             self.pipeline.connect(notch60, writer)
         if self.app is not None:
+            alpha_bp: Any = gp.Bandpass(f_lo=cfg.alpha_low_hz, f_hi=cfg.alpha_high_hz)
+            theta_bp: Any = gp.Bandpass(f_lo=cfg.theta_low_hz, f_hi=cfg.theta_high_hz)
+            alpha_pow: Any = gp.Equation("in**2")
+            theta_pow: Any = gp.Equation("in**2")
+            alpha_avg: Any = _build_moving_average_node(gp, window_size=int(cfg.sampling_rate * 0.5))
+            theta_avg: Any = _build_moving_average_node(gp, window_size=int(cfg.sampling_rate * 0.5))
+            self.pipeline.connect(notch60, alpha_bp)
+            self.pipeline.connect(notch60, theta_bp)
+            self.pipeline.connect(alpha_bp, alpha_pow)
+            self.pipeline.connect(theta_bp, theta_pow)
+            self.pipeline.connect(alpha_pow, alpha_avg)
+            self.pipeline.connect(theta_pow, theta_avg)
             time_scope: Any = gp.TimeSeriesScope(
                 amplitude_limit=cfg.time_scope_limit_uv,
                 time_window=cfg.time_scope_window_s,
@@ -303,13 +478,7 @@ class EEGRunner:
             if self.app is not None:
                 self.app.run()
             else:
-                start_s: float = time.time()
-                while True:
-                    if self._stop_event.is_set():
-                        break
-                    if self.config.duration_s > 0 and (time.time() - start_s) >= self.config.duration_s:
-                        break
-                    time.sleep(0.05)
+                self._stop_event.wait(timeout=self.config.duration_s if self.config.duration_s > 0 else None)
         finally:
             self.pipeline.stop()
         return self.metric_sink.latest()
@@ -320,9 +489,18 @@ class EEGRunner:
     def latest_metric(self) -> ConcentrationMetric | None:
         return self.metric_sink.latest()
 
+    def metric_count(self) -> int:
+        return self.metric_sink.metric_count()
+
+    def wait_for_metric(self, seen: int, timeout: float | None = None) -> int:
+        return self.metric_sink.wait_for_metric(seen, timeout)
+
     def metric_history(self) -> list[ConcentrationMetric]:
         return self.metric_sink.history()
 
+    def metric_history_arrays(self, count: int | None = None) -> np.ndarray:
+        return self.metric_sink.history_arrays(count)
+
 
 __all__: list[str] = [
     "ConcentrationMetric",
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 
 from . import EEGRunner
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AttentionState:
     timestamp_unix_seconds: float
     alpha_power: float
@@ -16,21 +16,9 @@ def latest_attention_states(runner: EEGRunner, count: int = 1) -> list[Attention
     if count < 1:
         raise ValueError("count must be >= 1")
 
-    metrics = runner.metric_history()
-    if not metrics:
-        return []
-
-    selected = metrics[-count:]
-    return [
-        AttentionState(
-            timestamp_unix_seconds=m.timestamp_unix_seconds,
-            alpha_power=m.alpha_power,
-            theta_power=m.theta_power,
-            alpha_theta_ratio=m.alpha_theta_ratio,
-            concentration_score=m.concentration_score,
-        )
-        for m in selected
-    ]
+    # Columns come back in field order, so each one maps straight onto an AttentionState argument.
+    columns = runner.metric_history_arrays(count).tolist()
+    return list(map(AttentionState, *columns))
 
 
 __all__: list[str] = ["AttentionState", "latest_attention_states"]
@@ -48,11 +36,14 @@ if __name__ == '__main__':
     threading.Thread(target=runner.run, daemon=True).start()
 
     async def poll_loop():
+        loop = asyncio.get_running_loop()
+        seen = 0
         while True:
+            # Wake on each new metric instead of polling; the timeout keeps Ctrl+C responsive.
+            seen = await loop.run_in_executor(None, runner.wait_for_metric, seen, 1.0)
             states = latest_attention_states(runner, count=1)
             if states:
                 state = states[0]
                 print(state.concentration_score, state.alpha_theta_ratio)
-            await asyncio.sleep(0.05)
 
     asyncio.run(poll_loop())
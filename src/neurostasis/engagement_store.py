@@ -3,14 +3,54 @@ from __future__ import annotations
 
 import json
 import threading
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
 DATA_DIR = Path.cwd() / "data"
-STORE_PATH = DATA_DIR / "engagement_scores.json"
+_COMPACT_EVERY = 100
 _store_lock = threading.Lock()
 
+_Stamp = tuple[tuple[int, int] | None, tuple[int, int] | None]
+
+
+@dataclass
+class _StoreState:
+    """File locations and in-memory caches of the engagement store."""
+
+    store_path: Path
+    # New records are appended here and folded into store_path every _COMPACT_EVERY appends.
+    log_path: Path
+    # The log is renamed here while a compaction is in flight, see _write_store_unlocked.
+    compacting_path: Path
+    # Newest EMA and pending log length, keyed by the file stamps they were taken at, so an
+    # append never has to parse the history just to find the previous EMA.
+    last_path: Path
+    # Parsed snapshot + log contents, reused until either file's mtime/size changes on disk.
+    cache: list[dict[str, Any]] | None = None
+    cache_stamp: _Stamp | None = None
+    log_count: int = 0
+    last_ema: float | None = None
+    last_stamp: _Stamp | None = None
+
+    @classmethod
+    def in_dir(cls, data_dir: Path) -> _StoreState:
+        return cls(
+            store_path=data_dir / "engagement_scores.json",
+            log_path=data_dir / "engagement_scores.ndjson",
+            compacting_path=data_dir / "engagement_scores.ndjson.compacting",
+            last_path=data_dir / "engagement_last.json",
+        )
+
+
+_state = _StoreState.in_dir(DATA_DIR)
+
 
 def _utc_now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -20,11 +60,31 @@ def _clamp_score(value: float) -> float:
     return max(0.0, min(100.0, value))
 
 
-def _read_store_unlocked() -> list[dict[str, Any]]:
-    if not STORE_PATH.exists():
-        return []
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _file_stamp(path: Path) -> tuple[int, int] | None:
     try:
-        raw = json.loads(STORE_PATH.read_text(encoding="utf-8"))
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _store_stamp() -> _Stamp:
+    return _file_stamp(_state.store_path), _file_stamp(_state.log_path)
+
+
+def _stamp_key(stamp: _Stamp) -> list[list[int] | None]:
+    return [list(part) if part is not None else None for part in stamp]
+
+
+def _parse_store_unlocked() -> list[dict[str, Any]]:
+    try:
+        raw = json.loads(_state.store_path.read_text(encoding="utf-8"))
     except Exception:
         return []
     if not isinstance(raw, list):
@@ -36,23 +96,108 @@ def _read_store_unlocked() -> list[dict[str, Any]]:
     return out
 
 
+def _parse_log_unlocked() -> list[dict[str, Any]]:
+    try:
+        lines = _state.log_path.read_text(encoding="utf-8").splitlines()
+    except Exception:
+        return []
+    out: list[dict[str, Any]] = []
+    for line in lines:
+        try:
+            item = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(item, dict):
+            out.append(item)
+    return out
+
+
+def _read_store_unlocked() -> list[dict[str, Any]]:
+    """Returns the cached record list, re-parsing only when the files changed."""
+    stamp = _store_stamp()
+    if _state.cache is None or stamp != _state.cache_stamp:
+        log_records = _parse_log_unlocked()
+        _state.cache = _parse_store_unlocked() + log_records
+        _state.cache_stamp = stamp
+        _state.log_count = len(log_records)
+    return _state.cache
+
+
+def _finish_compaction_unlocked() -> None:
+    """Completes a compaction interrupted after the log was set aside."""
+    if not _state.compacting_path.exists():
+        return
+    tmp = _state.store_path.with_suffix(".tmp")
+    if tmp.exists():
+        tmp.replace(_state.store_path)
+    _state.compacting_path.unlink()
+
+
 def _write_store_unlocked(records: list[dict[str, Any]]) -> None:
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    tmp = STORE_PATH.with_suffix(".tmp")
-    tmp.write_text(json.dumps(records, indent=2), encoding="utf-8")
-    tmp.replace(STORE_PATH)
+    """Writes a full snapshot and clears the append log it supersedes."""
+    _state.store_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _state.store_path.with_suffix(".tmp")
+    tmp.write_bytes(_dumps(records))
+    # Once the log is renamed the finished tmp snapshot is the only copy of its records, so a
+    # crash at any later step is rolled forward by _finish_compaction_unlocked.
+    if _state.log_path.exists():
+        _state.log_path.replace(_state.compacting_path)
+    tmp.replace(_state.store_path)
+    _state.compacting_path.unlink(missing_ok=True)
+    _state.cache = records
+    _state.cache_stamp = _store_stamp()
+    _state.log_count = 0
+
+
+def _load_last_ema_unlocked() -> float | None:
+    """Returns the newest stored EMA, parsing the full history only if the sidecar is stale."""
+    stamp = _store_stamp()
+    if _state.last_stamp == stamp:
+        return _state.last_ema
+    try:
+        sidecar = json.loads(_state.last_path.read_text(encoding="utf-8"))
+    except Exception:
+        sidecar = None
+    if isinstance(sidecar, dict) and sidecar.get("stamp") == _stamp_key(stamp):
+        last_val = sidecar.get("ema_score")
+        _state.log_count = int(sidecar.get("log_count", 0))
+    else:
+        records = _read_store_unlocked()
+        last_val = records[-1].get("ema_score") if records else None
+    _state.last_ema = _clamp_score(float(last_val)) if isinstance(last_val, (int, float)) else None
+    _state.last_stamp = stamp
+    return _state.last_ema
+
+
+def _save_last_ema_unlocked(ema: float) -> None:
+    stamp = _store_stamp()
+    tmp = _state.last_path.with_suffix(".tmp")
+    tmp.write_bytes(_dumps({"ema_score": ema, "log_count": _state.log_count, "stamp": _stamp_key(stamp)}))
+    tmp.replace(_state.last_path)
+    _state.last_ema = ema
+    _state.last_stamp = stamp
+
+
+def _append_record_unlocked(record: dict[str, Any]) -> None:
+    before = _store_stamp()
+    _state.log_path.parent.mkdir(parents=True, exist_ok=True)
+    with _state.log_path.open("ab") as fh:
+        fh.write(_dumps(record) + b"\n")
+    _state.log_count += 1
+    # Extend an up-to-date history cache in place; a stale or missing one is rebuilt lazily on read.
+    if _state.cache is not None and _state.cache_stamp == before:
+        _state.cache.append(record)
+        _state.cache_stamp = _store_stamp()
+    if _state.log_count >= _COMPACT_EVERY:
+        _write_store_unlocked(_read_store_unlocked())
 
 
 def append_engagement_record(record: dict[str, Any], alpha: float = 0.3) -> dict[str, Any]:
     """Appends a session record and computes EMA based on prior stored value."""
     alpha = max(0.01, min(1.0, alpha))
     with _store_lock:
-        records = _read_store_unlocked()
-        last_ema = None
-        if records:
-            last_val = records[-1].get("ema_score")
-            if isinstance(last_val, (int, float)):
-                last_ema = _clamp_score(float(last_val))
+        _finish_compaction_unlocked()
+        last_ema = _load_last_ema_unlocked()
         score = _clamp_score(float(record.get("session_score", 0.0)))
         ema = score if last_ema is None else _clamp_score(alpha * score + (1.0 - alpha) * last_ema)
         enriched = dict(record)
@@ -60,13 +205,14 @@ def append_engagement_record(record: dict[str, Any], alpha: float = 0.3) -> dict
         enriched["ema_score"] = round(ema, 3)
         enriched.setdefault("alpha", alpha)
         enriched.setdefault("timestamp_utc", _utc_now_iso())
-        records.append(enriched)
-        _write_store_unlocked(records)
-        return enriched
+        _append_record_unlocked(enriched)
+        _save_last_ema_unlocked(enriched["ema_score"])
+    # The stored dict is shared with the history cache, so callers get their own copy.
+    return dict(enriched)
 
 
 def get_engagement_history(limit: int = 200) -> list[dict[str, Any]]:
-    with _store_lock:
-        records = _read_store_unlocked()
     limit = max(1, limit)
-    return records[-limit:]
+    with _store_lock:
+        _finish_compaction_unlocked()
+        return [dict(record) for record in _read_store_unlocked()[-limit:]]
@@ -1,29 +1,54 @@
 """FastAPI-backed PIPR acquisition server with static frontend assets."""
 from __future__ import annotations
 
+import asyncio
+import functools
+import gzip
+import json
 import math
-import queue
-import statistics
+import os
 import threading
 import time
 import webbrowser
+from collections import deque
 from datetime import datetime, timezone
+from email.utils import formatdate
+from itertools import islice
+from operator import attrgetter
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Callable, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 from .eeg import EEGConfig, EEGRunner
 from .eeg.attention import AttentionState, latest_attention_states
 from .engagement import register_engagement_routes
 from .engagement_store import append_engagement_record
 
+try:
+    import orjson
+except ModuleNotFoundError:
+    orjson = None
+
 IP_ADDRESS = "172.20.10.3"
 PORT = "8080"
 WEB_DIR = Path(__file__).resolve().parent / "web"
+# Idle /events streams send an SSE comment this often to keep proxies from closing them.
+SSE_KEEPALIVE_S = 30.0
+SSE_COALESCE_S = 0.02
+DEMO_SAMPLE_HZ = 30.0
+GAZE_BUFFER_HZ = 200
+# Session score weights, reported under these names.
+SCORE_PARTS = ("pupil_response", "recovery", "attentiveness")
+SCORE_WEIGHTS = np.array([0.65, 0.25, 0.10])
+PHASES = ("BASELINE", "LIGHT_ON", "POST_LIGHT")
+MAX_START_BODY_BYTES = 4096
+_index_cache: Optional[tuple[tuple[int, int], bytes, bytes, dict[str, str]]] = None
 
 
 class StartRequest(BaseModel):
@@ -35,36 +60,118 @@ class StartRequest(BaseModel):
     demo: bool = False
 
 
-_subscribers: list[queue.Queue] = []
-_subscribers_lock = threading.Lock()
+# Sequence-numbered, pre-encoded events shared by all readers; each reader keeps its own cursor.
+_EVENT_LOG_SIZE = 4096
+_event_log: deque[tuple[int, bytes]] = deque(maxlen=_EVENT_LOG_SIZE)
+_event_cond = threading.Condition()
+_event_seq = 0
+_event_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = set()
 
+# Replaced, never mutated, so /status can return it without a lock.
 _snapshot = {"phase": "idle", "elapsed": 0.0, "pupil": None, "samples": 0, "gaze_x": None, "gaze_y": None, "worn": None}
-_snapshot_lock = threading.Lock()
 
 _results: Optional[dict] = None
 _acquisition_thread: Optional[threading.Thread] = None
 _run_lock = threading.Lock()
 
 
+def _dumps(obj: object) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
 def _broadcast(event: dict) -> None:
-    with _subscribers_lock:
-        for subscriber in list(_subscribers):
-            subscriber.put(event)
+    global _event_seq
+    payload = _dumps(event)
+    with _event_cond:
+        _event_seq += 1
+        _event_log.append((_event_seq, payload))
+        _event_cond.notify_all()
+        waiters = list(_event_waiters)
+        _event_waiters.clear()
+    for loop, waiter in waiters:
+        try:
+            loop.call_soon_threadsafe(_wake, waiter)
+        except RuntimeError:
+            pass  # the reader's loop has already shut down
 
 
-def _subscribe() -> queue.Queue:
-    subscriber: queue.Queue = queue.Queue()
-    with _subscribers_lock:
-        _subscribers.append(subscriber)
-    return subscriber
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
 
 
-def _unsubscribe(subscriber: queue.Queue) -> None:
-    with _subscribers_lock:
-        try:
-            _subscribers.remove(subscriber)
-        except ValueError:
-            pass
+def _events_after(seq: int, timeout: float, limit: Optional[int] = None) -> tuple[int, list[bytes]]:
+    """Readers that fell behind the log get a leading {"type": "lagged"} event instead of the lost ones."""
+    with _event_cond:
+        _event_cond.wait_for(lambda: _event_seq > seq, timeout)
+        pending = min(_event_seq - seq, len(_event_log))
+        if pending <= 0:
+            return seq, []
+        dropped = _event_seq - seq - pending
+        take = pending if limit is None else min(limit, pending)
+        batch = list(islice(reversed(_event_log), pending - take, pending))
+    batch.reverse()
+    payloads = [payload for (_, payload) in batch]
+    if dropped:
+        payloads.insert(0, _dumps({"type": "lagged", "dropped": dropped}))
+    return batch[-1][0], payloads
+
+
+def _update_snapshot(changes: dict) -> None:
+    global _snapshot
+    _snapshot = {**_snapshot, **changes}
+
+
+def _batch_body(payloads: list[bytes]) -> bytes:
+    if len(payloads) == 1:
+        return payloads[0]
+    return b'{"type":"batch","events":[' + b",".join(payloads) + b"]}"
+
+
+def _resume_cursor(seq: Optional[int]) -> int:
+    if seq is None or not 0 <= seq <= _event_seq:
+        return _event_seq
+    return seq
+
+
+async def _wait_events(seq: int, timeout: float, limit: Optional[int] = None) -> tuple[int, list[bytes]]:
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+    entry = (loop, waiter)
+    with _event_cond:
+        if _event_seq > seq:
+            waiter.set_result(None)
+        else:
+            _event_waiters.add(entry)
+    try:
+        await asyncio.wait_for(waiter, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        with _event_cond:
+            _event_waiters.discard(entry)
+    return _events_after(seq, 0.0, limit)
+
+
+@functools.lru_cache(maxsize=1)
+def _device_cls() -> Optional[type]:
+    try:
+        from pupil_labs.realtime_api.simple import Device  # type: ignore
+    except Exception:
+        return None
+    return Device
+
+
+_GAZE_FIELDS = ("pupil_diameter_left", "pupil_diameter_right", "x", "y", "worn")
+
+
+def _gaze_reader(gaze: object) -> Callable[[object], tuple]:
+    # Only a NamedTuple type guarantees every later datum has the fields too.
+    if set(_GAZE_FIELDS).issubset(getattr(type(gaze), "_fields", ())):
+        return attrgetter(*_GAZE_FIELDS)
+    return lambda datum: tuple(getattr(datum, name, None) for name in _GAZE_FIELDS)
 
 
 def _pick_pupil(pl: Optional[float], pr: Optional[float]) -> Optional[float]:
@@ -77,46 +184,61 @@ def _pick_pupil(pl: Optional[float], pr: Optional[float]) -> Optional[float]:
     return (pl + pr) / 2.0
 
 
-def _mean(xs: list[Optional[float]]) -> Optional[float]:
-    filtered = [x for x in xs if x is not None]
-    return statistics.fmean(filtered) if filtered else None
+class _WindowStats:
+    __slots__ = ("start", "end", "samples", "count", "total", "minimum")
+
+    def __init__(self, start: float, end: float) -> None:
+        self.start = start
+        self.end = end
+        self.samples = 0
+        self.count = 0
+        self.total = 0.0
+        self.minimum: Optional[float] = None
+
+    def add(self, elapsed: float, pupil: Optional[float]) -> None:
+        if not self.start <= elapsed <= self.end:
+            return
+        self.samples += 1
+        if pupil is not None:
+            self.count += 1
+            self.total += pupil
+            if self.minimum is None or pupil < self.minimum:
+                self.minimum = pupil
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
 
 
 def _clamp(value: float, lo: float, hi: float) -> float:
     return max(lo, min(hi, value))
 
 
-def _normalize_sequence(points: list[tuple[float, float]]) -> list[tuple[float, float]]:
-    if not points:
-        return []
-    xs = [p[0] for p in points]
-    ys = [p[1] for p in points]
-    if all(0.0 <= x <= 1.0 for x in xs) and all(0.0 <= y <= 1.0 for y in ys):
-        return points
+def _normalize_sequence(points: np.ndarray | list[tuple[float, float]]) -> np.ndarray:
+    """Min-max scales each axis, unless the points already lie within [0, 1]."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if not len(pts):
+        return pts
+    lo = pts.min(axis=0)
+    hi = pts.max(axis=0)
+    if lo.min() >= 0.0 and hi.max() <= 1.0:
+        return pts
+    return (pts - lo) / np.maximum(hi - lo, 1e-6)
 
-    min_x, max_x = min(xs), max(xs)
-    min_y, max_y = min(ys), max(ys)
-    span_x = max(1e-6, max_x - min_x)
-    span_y = max(1e-6, max_y - min_y)
-    return [((x - min_x) / span_x, (y - min_y) / span_y) for (x, y) in points]
 
+def _simulated_trace(total_s: float, t_on: float, t_off: float, hz: float = DEMO_SAMPLE_HZ) -> np.ndarray:
+    t = np.arange(int(total_s * hz) + 1) / hz
+    base = 5.0 + 0.25 * np.sin(t * 0.35)
+    light = base - np.minimum(1.0, (t - t_on) / 1.5) * 2.0 + 0.12 * np.sin(t * 3.1)
+    post = base - 1.1 * np.exp(-(t - t_off) / 28.0) + 0.08 * np.sin(t * 2.3)
+    return np.where(t < t_on, base, np.where(t < t_off, light, post))
 
-def _simulated_pupil(elapsed: float, t_on: float, t_off: float) -> float:
-    base = 5.0 + 0.25 * math.sin(elapsed * 0.35)
-    if elapsed < t_on:
-        return base
-    if elapsed < t_off:
-        frac = min(1.0, (elapsed - t_on) / 1.5)
-        return base - frac * 2.0 + 0.12 * math.sin(elapsed * 3.1)
-    tau = (elapsed - t_off) / 28.0
-    residual = 1.1 * math.exp(-tau)
-    return base - residual + 0.08 * math.sin(elapsed * 2.3)
 
-
-def _simulated_gaze(elapsed: float) -> tuple[float, float]:
-    x = 0.5 + 0.18 * math.sin(elapsed * 0.9) + 0.03 * math.sin(elapsed * 2.7)
-    y = 0.5 + 0.12 * math.cos(elapsed * 0.7) + 0.02 * math.sin(elapsed * 2.2)
-    return (max(0.0, min(1.0, x)), max(0.0, min(1.0, y)))
+def _simulated_gaze(total_s: float, hz: float = DEMO_SAMPLE_HZ) -> np.ndarray:
+    t = np.arange(int(total_s * hz) + 1) / hz
+    x = 0.5 + 0.18 * np.sin(t * 0.9) + 0.03 * np.sin(t * 2.7)
+    y = 0.5 + 0.12 * np.cos(t * 0.7) + 0.02 * np.sin(t * 2.2)
+    return np.clip(np.column_stack((x, y)), 0.0, 1.0)
 
 
 def _run_acquisition(cfg: StartRequest) -> None:
@@ -130,13 +252,15 @@ def _run_acquisition(cfg: StartRequest) -> None:
     demo = cfg.demo
 
     device = None
+    device_cls = None if demo else _device_cls()
+    if not demo and device_cls is None:
+        _broadcast({"type": "log", "msg": "pupil-labs-realtime-api is not installed. Switching to DEMO mode."})
+        demo = True
     if not demo:
         for attempt in range(1, retries + 1):
             _broadcast({"type": "log", "msg": f"Connection attempt {attempt}/{retries}..."})
             try:
-                from pupil_labs.realtime_api.simple import Device  # type: ignore
-
-                device = Device(IP_ADDRESS, PORT)
+                device = device_cls(IP_ADDRESS, PORT)
                 _broadcast({"type": "log", "msg": "Connected to Pupil Labs device."})
                 break
             except Exception as exc:
@@ -150,17 +274,30 @@ def _run_acquisition(cfg: StartRequest) -> None:
     if demo:
         _broadcast({"type": "log", "msg": "Running in DEMO mode (simulated pupil data)."})
 
-    _broadcast({"type": "phase", "phase": "BASELINE", "elapsed": 0.0})
-    t0 = time.time()
-    samples: list[tuple[float, Optional[float]]] = []
-    gaze_trace: list[tuple[float, float]] = []
-    eeg_trace: list[AttentionState] = []
-    last_tick = -1.0
-    last_gaze_emit = -1.0
-    last_eeg_poll = -1.0
-    last_eeg_log = -1.0
-    current_phase = "BASELINE"
+    _broadcast({"type": "phase", "phase": PHASES[0], "elapsed": 0.0})
+    t0 = time.monotonic()
+    base_window = _WindowStats(t_on - baseline_s, t_on)
+    light_window = _WindowStats(t_on, t_off)
+    pipr6_window = _WindowStats(t_off + 5.0, t_off + 7.0)
+    pipr30_window = _WindowStats(t_off + 25.0, t_off + 35.0)
+    n_samples = 0
+    gaze_trace = np.empty((min(int(total_s * GAZE_BUFFER_HZ), 1 << 16) + 64, 2))
+    n_gaze = 0
+    demo_period = 1.0 / DEMO_SAMPLE_HZ
+    demo_k = 0
+    demo_trace = _simulated_trace(total_s, t_on, t_off) if demo else None
+    demo_gaze = _simulated_gaze(total_s) if demo else None
+    gaze_type: Optional[type] = None
+    read_gaze: Callable[[object], tuple] = _gaze_reader(None)
+    next_gaze_emit = 0.0
+    next_eeg_poll = 0.0
+    next_eeg_log = 0.0
+    next_tick = 0.0
+    phase_ends = (t_on, t_off, math.inf)
+    phase_idx = 0
+    current_phase = PHASES[0]
     latest_eeg: Optional[AttentionState] = None
+    eeg_seen = 0
     eeg_runner: Optional[EEGRunner] = None
     eeg_thread: Optional[threading.Thread] = None
     eeg_error: Optional[str] = None
@@ -189,42 +326,46 @@ def _run_acquisition(cfg: StartRequest) -> None:
         eeg_status = "unavailable"
         _broadcast({"type": "log", "msg": f"EEG unavailable: {eeg_error}"})
 
+    demo_timer: Optional[int] = None
+    if demo and hasattr(os, "timerfd_create"):
+        demo_timer = os.timerfd_create(time.CLOCK_MONOTONIC)
+        os.timerfd_settime(demo_timer, flags=os.TFD_TIMER_ABSTIME, initial=t0 + demo_period, interval=demo_period)
+
     try:
         while True:
             if demo:
-                elapsed = time.time() - t0
-                pupil: Optional[float] = _simulated_pupil(elapsed, t_on, t_off)
-                gaze_x, gaze_y = _simulated_gaze(elapsed)
+                elapsed = time.monotonic() - t0
+                k = min(int(elapsed * DEMO_SAMPLE_HZ), demo_trace.size - 1)
+                pupil: Optional[float] = float(demo_trace[k])
+                gaze_x, gaze_y = demo_gaze[k].tolist()
                 worn = True
-                timestamp = t0 + elapsed
-                time.sleep(0.033)
             else:
                 gaze = device.receive_gaze_datum()  # type: ignore[union-attr]
-                timestamp = getattr(gaze, "timestamp_unix_seconds", None) or time.time()
-                pl = getattr(gaze, "pupil_diameter_left", None)
-                pr = getattr(gaze, "pupil_diameter_right", None)
+                if type(gaze) is not gaze_type:
+                    gaze_type = type(gaze)
+                    read_gaze = _gaze_reader(gaze)
+                pl, pr, gaze_x, gaze_y, worn = read_gaze(gaze)
                 pupil = _pick_pupil(pl, pr)
-                gaze_x = getattr(gaze, "x", None)
-                gaze_y = getattr(gaze, "y", None)
-                worn = getattr(gaze, "worn", None)
-                elapsed = time.time() - t0
+                elapsed = time.monotonic() - t0
 
-            samples.append((timestamp, pupil))
+            base_window.add(elapsed, pupil)
+            light_window.add(elapsed, pupil)
+            pipr6_window.add(elapsed, pupil)
+            pipr30_window.add(elapsed, pupil)
+            n_samples += 1
             if worn is not False and gaze_x is not None and gaze_y is not None:
-                gaze_trace.append((float(gaze_x), float(gaze_y)))
-
-            if elapsed >= t_off:
-                new_phase = "POST_LIGHT"
-            elif elapsed >= t_on:
-                new_phase = "LIGHT_ON"
-            else:
-                new_phase = "BASELINE"
-
-            if new_phase != current_phase:
-                current_phase = new_phase
+                if n_gaze == len(gaze_trace):
+                    gaze_trace = np.concatenate((gaze_trace, np.empty_like(gaze_trace)))
+                gaze_trace[n_gaze] = (gaze_x, gaze_y)
+                n_gaze += 1
+
+            if elapsed >= phase_ends[phase_idx]:
+                while elapsed >= phase_ends[phase_idx]:
+                    phase_idx += 1
+                current_phase = PHASES[phase_idx]
                 _broadcast({"type": "phase", "phase": current_phase, "elapsed": round(elapsed, 2)})
 
-            if elapsed - last_gaze_emit >= 0.05:
+            if elapsed >= next_gaze_emit:
                 gaze_event = {
                     "type": "gaze",
                     "phase": current_phase,
@@ -233,14 +374,15 @@ def _run_acquisition(cfg: StartRequest) -> None:
                     "gaze_y": gaze_y,
                     "worn": worn,
                 }
-                with _snapshot_lock:
-                    _snapshot.update({"gaze_x": gaze_x, "gaze_y": gaze_y, "worn": worn})
+                _update_snapshot({"gaze_x": gaze_x, "gaze_y": gaze_y, "worn": worn})
                 _broadcast(gaze_event)
-                last_gaze_emit = elapsed
+                next_gaze_emit = elapsed + 0.05
 
-            if eeg_runner is not None and elapsed - last_eeg_poll >= 0.05:
+            if eeg_runner is not None and elapsed >= next_eeg_poll:
                 try:
-                    eeg_states = latest_attention_states(eeg_runner, count=1)
+                    eeg_count = eeg_runner.metric_count()
+                    eeg_states = latest_attention_states(eeg_runner, count=1) if eeg_count != eeg_seen else []
+                    eeg_seen = eeg_count
                 except Exception as exc:
                     eeg_states = []
                     if eeg_error is None:
@@ -248,16 +390,14 @@ def _run_acquisition(cfg: StartRequest) -> None:
                         _broadcast({"type": "log", "msg": f"EEG polling error: {eeg_error}"})
                 if eeg_states:
                     latest_eeg = eeg_states[0]
-                    eeg_trace.append(latest_eeg)
-                    with _snapshot_lock:
-                        _snapshot.update(
-                            {
-                                "eeg_concentration_score": round(latest_eeg.concentration_score, 3),
-                                "eeg_alpha_theta_ratio": round(latest_eeg.alpha_theta_ratio, 6),
-                                "eeg_status": eeg_status,
-                            }
-                        )
-                    if elapsed - last_eeg_log >= 1.0:
+                    _update_snapshot(
+                        {
+                            "eeg_concentration_score": round(latest_eeg.concentration_score, 3),
+                            "eeg_alpha_theta_ratio": round(latest_eeg.alpha_theta_ratio, 6),
+                            "eeg_status": eeg_status,
+                        }
+                    )
+                    if elapsed >= next_eeg_log:
                         _broadcast(
                             {
                                 "type": "log",
@@ -268,16 +408,16 @@ def _run_acquisition(cfg: StartRequest) -> None:
                                 ),
                             }
                         )
-                        last_eeg_log = elapsed
-                last_eeg_poll = elapsed
+                        next_eeg_log = elapsed + 1.0
+                next_eeg_poll = elapsed + 0.05
 
-            if elapsed - last_tick >= 1.0:
+            if elapsed >= next_tick:
                 tick = {
                     "type": "tick",
                     "phase": current_phase,
                     "elapsed": round(elapsed, 2),
                     "pupil": round(pupil, 4) if pupil is not None else None,
-                    "samples": len(samples),
+                    "samples": n_samples,
                     "gaze_x": gaze_x,
                     "gaze_y": gaze_y,
                     "worn": worn,
@@ -289,14 +429,24 @@ def _run_acquisition(cfg: StartRequest) -> None:
                     ),
                     "eeg_status": eeg_status,
                 }
-                with _snapshot_lock:
-                    _snapshot.update(tick)
+                _update_snapshot(tick)
                 _broadcast(tick)
-                last_tick = elapsed
+                next_tick = math.floor(elapsed) + 1.0
 
             if elapsed >= total_s:
                 break
+
+            if demo_timer is not None:
+                os.read(demo_timer, 8)
+            elif demo:
+                # Absolute schedule, so loop overhead doesn't accumulate as drift.
+                demo_k += 1
+                delay = t0 + demo_k * demo_period - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
     finally:
+        if demo_timer is not None:
+            os.close(demo_timer)
         if device is not None:
             try:
                 device.close()  # type: ignore[union-attr]
@@ -308,31 +458,15 @@ def _run_acquisition(cfg: StartRequest) -> None:
             except Exception:
                 pass
         eeg_status = "stopped"
-        with _snapshot_lock:
-            _snapshot.update({"eeg_status": eeg_status})
+        _update_snapshot({"eeg_status": eeg_status})
         if eeg_thread is not None and eeg_thread.is_alive():
             eeg_thread.join(timeout=2.0)
         _broadcast({"type": "log", "msg": "EEG attention stream stopped."})
 
-    def in_window(ts: float, start: float, end: float) -> bool:
-        return start <= ts <= end
-
-    base_start = t0 + (t_on - baseline_s)
-    base_end = t0 + t_on
-    pipr6_start = t0 + t_off + 5.0
-    pipr6_end = t0 + t_off + 7.0
-    pipr30_start = t0 + t_off + 25.0
-    pipr30_end = t0 + t_off + 35.0
-
-    base_vals = [p for (ts, p) in samples if in_window(ts, base_start, base_end)]
-    pipr6_vals = [p for (ts, p) in samples if in_window(ts, pipr6_start, pipr6_end)]
-    pipr30_vals = [p for (ts, p) in samples if in_window(ts, pipr30_start, pipr30_end)]
-
-    baseline = _mean(base_vals)
-    pipr6_mean = _mean(pipr6_vals)
-    pipr30_mean = _mean(pipr30_vals)
-    light_vals = [p for (ts, p) in samples if in_window(ts, t0 + t_on, t0 + t_off)]
-    light_min = min((p for p in light_vals if p is not None), default=None)
+    baseline = base_window.mean
+    pipr6_mean = pipr6_window.mean
+    pipr30_mean = pipr30_window.mean
+    light_min = light_window.minimum
 
     pipr_6 = (baseline - pipr6_mean) if (baseline is not None and pipr6_mean is not None) else None
     pipr_30 = (baseline - pipr30_mean) if (baseline is not None and pipr30_mean is not None) else None
@@ -354,20 +488,13 @@ def _run_acquisition(cfg: StartRequest) -> None:
     attentiveness_score: Optional[float] = None
     attentiveness_reason: Optional[str] = None
     gaze_jitter_rms: Optional[float] = None
-    norm_trace = _normalize_sequence(gaze_trace)
+    norm_trace = _normalize_sequence(gaze_trace[:n_gaze])
     if len(norm_trace) < 6:
         attentiveness_reason = "Insufficient gaze samples to estimate jitter-based gaze stability."
     else:
-        deltas = []
-        for i in range(1, len(norm_trace)):
-            dx = norm_trace[i][0] - norm_trace[i - 1][0]
-            dy = norm_trace[i][1] - norm_trace[i - 1][1]
-            deltas.append(math.sqrt(dx * dx + dy * dy))
-        if deltas:
-            gaze_jitter_rms = math.sqrt(statistics.fmean([d * d for d in deltas]))
-            attentiveness_score = 100.0 * (1.0 - _clamp(gaze_jitter_rms / 0.08, 0.0, 1.0))
-        else:
-            attentiveness_reason = "Gaze jitter could not be computed."
+        steps = np.diff(norm_trace, axis=0)
+        gaze_jitter_rms = math.sqrt(float(np.einsum("ij,ij->", steps, steps)) / len(steps))
+        attentiveness_score = 100.0 * (1.0 - _clamp(gaze_jitter_rms / 0.08, 0.0, 1.0))
 
     pupil_response_score: Optional[float] = None
     response_reason: Optional[str] = None
@@ -389,17 +516,12 @@ def _run_acquisition(cfg: StartRequest) -> None:
     else:
         recovery_score = 100.0 * _clamp(pipr_30 / 1.2, 0.0, 1.0)
 
-    weighted_parts = []
-    if pupil_response_score is not None:
-        weighted_parts.append((0.65, pupil_response_score))
-    if recovery_score is not None:
-        weighted_parts.append((0.25, recovery_score))
-    if attentiveness_score is not None:
-        weighted_parts.append((0.10, attentiveness_score))
-
-    if weighted_parts:
-        weight_sum = sum(w for (w, _) in weighted_parts)
-        session_score = sum(w * s for (w, s) in weighted_parts) / weight_sum
+    # Missing components become NaN and drop out, with the remaining weights renormalized.
+    part_scores = np.array([pupil_response_score, recovery_score, attentiveness_score], dtype=np.float64)
+    present = ~np.isnan(part_scores)
+    if present.any():
+        weights = SCORE_WEIGHTS[present]
+        session_score = float(weights @ part_scores[present] / weights.sum())
     else:
         session_score = 0.0
 
@@ -420,7 +542,9 @@ def _run_acquisition(cfg: StartRequest) -> None:
             direction_components.append(_clamp((pupil_response_score - 50.0) / 50.0, -1.0, 1.0))
         if recovery_score is not None:
             direction_components.append(_clamp((recovery_score - 50.0) / 50.0, -1.0, 1.0))
-        direction_signal = statistics.fmean(direction_components) if direction_components else 0.0
+        direction_signal = (
+            math.fsum(direction_components) / len(direction_components) if direction_components else 0.0
+        )
 
         boost = max(0.0, direction_signal) * (0.12 + 0.28 * focus_match)
         penalty = max(0.0, -direction_signal) * (0.12 + 0.28 * focus_match) + 0.36 * focus_mismatch
@@ -448,7 +572,7 @@ def _run_acquisition(cfg: StartRequest) -> None:
             "eeg_concentration_score": None if eeg_concentration_score is None else round(eeg_concentration_score, 3),
             "eeg_alpha_theta_ratio": None if eeg_alpha_theta_ratio is None else round(eeg_alpha_theta_ratio, 6),
             "gaze_jitter_rms": None if gaze_jitter_rms is None else round(gaze_jitter_rms, 6),
-            "weights": {"pupil_response": 0.65, "recovery": 0.25, "attentiveness": 0.10},
+            "weights": dict(zip(SCORE_PARTS, SCORE_WEIGHTS.tolist())),
             "notes": (
                 "Current score combines pupil dynamics, low-weight gaze stability proxy, and EEG attention direction."
             ),
@@ -460,9 +584,9 @@ def _run_acquisition(cfg: StartRequest) -> None:
         "baseline": baseline,
         "pipr_6": pipr_6,
         "pipr_30": pipr_30,
-        "n_base": len(base_vals),
-        "n_pipr6": len(pipr6_vals),
-        "n_pipr30": len(pipr30_vals),
+        "n_base": base_window.samples,
+        "n_pipr6": pipr6_window.samples,
+        "n_pipr30": pipr30_window.samples,
         "reason_baseline": reason_baseline,
         "reason_pipr6": reason_pipr6,
         "reason_pipr30": reason_pipr30,
@@ -482,7 +606,7 @@ def _run_acquisition(cfg: StartRequest) -> None:
             "reason_concentration": attentiveness_reason,
             "reason_eeg": reason_eeg,
             "retake_recommended": retake_recommended,
-            "weights": {"pupil_response": 0.65, "recovery": 0.25, "attentiveness": 0.10},
+            "weights": dict(zip(SCORE_PARTS, SCORE_WEIGHTS.tolist())),
             "scientific_notes": (
                 "This is a proxy engagement metric. It is not a clinical diagnosis. "
                 "Gaze stability can reflect relaxation as well as attentional state. "
@@ -498,48 +622,126 @@ app.mount("/static", StaticFiles(directory=WEB_DIR), name="static")
 register_engagement_routes(app)
 
 
+def _index_page() -> tuple[bytes, bytes, dict[str, str]]:
+    global _index_cache
+    path = WEB_DIR / "index.html"
+    try:
+        st = path.stat()
+        stamp = (st.st_mtime_ns, st.st_size)
+        if _index_cache is None or _index_cache[0] != stamp:
+            raw = path.read_bytes()
+            headers = {
+                # Weak, so the plain and gzipped bodies share one validator.
+                "ETag": f'W/"{st.st_mtime_ns:x}-{st.st_size:x}"',
+                "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+                "Vary": "Accept-Encoding",
+            }
+            _index_cache = (stamp, raw, gzip.compress(raw, compresslevel=9), headers)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="index.html not found")
+    return _index_cache[1:]
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    qvalues: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, *params = (item.strip() for item in part.split(";"))
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding.lower()] = q
+    return qvalues.get("gzip", qvalues.get("*", 0.0)) > 0.0
+
+
 @app.get("/")
-def root() -> FileResponse:
-    return FileResponse(WEB_DIR / "index.html")
+def root(request: Request) -> Response:
+    raw, compressed, headers = _index_page()
+    if_none_match = request.headers.get("if-none-match", "")
+    etags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if "*" in etags or headers["ETag"].removeprefix("W/") in etags:
+        return Response(status_code=304, headers=headers)
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        return Response(compressed, media_type="text/html", headers={**headers, "Content-Encoding": "gzip"})
+    return Response(raw, media_type="text/html", headers=headers)
 
 
 @app.get("/next-event")
-def next_event() -> dict:
-    subscriber = _subscribe()
-    try:
-        first = subscriber.get(timeout=120)
-        events = [first]
-        for _ in range(63):
-            try:
-                events.append(subscriber.get_nowait())
-            except queue.Empty:
-                break
-        if len(events) == 1:
-            return first
-        return {"type": "batch", "events": events}
-    except queue.Empty:
-        return {"type": "timeout"}
-    finally:
-        _unsubscribe(subscriber)
+async def next_event(since: Optional[int] = Query(default=None)) -> Response:
+    """Responses carry "seq" to pass back as `since`; a lone event comes unwrapped only when `since` is omitted."""
+    seq, pending = await _wait_events(_resume_cursor(since), 120.0, limit=64)
+    if not pending:
+        body = b'{"type":"timeout","seq":%d}' % seq
+    elif since is None and len(pending) == 1:
+        body = pending[0][:-1] + b',"seq":%d}' % seq
+    else:
+        body = b'{"type":"batch","seq":%d,"events":[' % seq + b",".join(pending) + b"]}"
+    return Response(body, media_type="application/json")
+
+
+@app.get("/events")
+async def events(request: Request) -> StreamingResponse:
+    """Frames carry their sequence number as SSE id, so reconnects resume from Last-Event-ID."""
+    last_event_id = request.headers.get("last-event-id", "")
+
+    async def stream() -> AsyncIterator[bytes]:
+        seq = _resume_cursor(int(last_event_id) if last_event_id.isdigit() else None)
+        while True:
+            seq, pending = await _wait_events(seq, SSE_KEEPALIVE_S)
+            if not pending:
+                yield b": keepalive\n\n"
+                continue
+            await asyncio.sleep(SSE_COALESCE_S)
+            seq, burst = _events_after(seq, 0.0)
+            yield b"id: %d\ndata: " % seq + _batch_body(pending + burst) + b"\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive"},
+    )
 
 
 @app.get("/status")
-def status() -> dict:
-    with _snapshot_lock:
-        return dict(_snapshot)
+def status() -> Response:
+    return Response(_dumps(_snapshot), media_type="application/json")
 
 
 @app.get("/results")
-def results() -> dict:
+def results() -> Response:
     if _results is None:
         raise HTTPException(status_code=404, detail="not ready")
-    return _results
+    return Response(_dumps(_results), media_type="application/json")
+
+
+async def _read_start_request(request: Request) -> StartRequest:
+    try:
+        declared = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid Content-Length") from None
+    if declared > MAX_START_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="request body too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_START_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="request body too large")
+    try:
+        return StartRequest.model_validate_json(bytes(body))
+    except ValidationError as exc:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in exc.errors(include_url=False)]
+        raise RequestValidationError(errors) from exc
 
 
 @app.post("/start")
-def start(config: StartRequest) -> dict:
-    global _acquisition_thread, _results
+async def start(request: Request) -> dict:
+    global _acquisition_thread, _results, _snapshot
 
+    config = await _read_start_request(request)
     if config.t_on >= config.t_off:
         raise HTTPException(status_code=400, detail="t_on must be less than t_off")
     if config.t_off >= config.total_s:
@@ -552,22 +754,18 @@ def start(config: StartRequest) -> dict:
             return {"status": "already running"}
 
         _results = None
-        with _snapshot_lock:
-            _snapshot.clear()
-            _snapshot.update(
-                {
-                    "phase": "starting",
-                    "elapsed": 0.0,
-                    "pupil": None,
-                    "samples": 0,
-                    "gaze_x": None,
-                    "gaze_y": None,
-                    "worn": None,
-                    "eeg_concentration_score": None,
-                    "eeg_alpha_theta_ratio": None,
-                    "eeg_status": "starting",
-                }
-            )
+        _snapshot = {
+            "phase": "starting",
+            "elapsed": 0.0,
+            "pupil": None,
+            "samples": 0,
+            "gaze_x": None,
+            "gaze_y": None,
+            "worn": None,
+            "eeg_concentration_score": None,
+            "eeg_alpha_theta_ratio": None,
+            "eeg_status": "starting",
+        }
         _acquisition_thread = threading.Thread(target=_run_acquisition, args=(config,), daemon=True)
         _acquisition_thread.start()
     return {"status": "started"}
@@ -388,6 +388,8 @@ async function waitForEvents() {
 
     if (event.type === "log") {
       log(event.msg);
+    } else if (event.type === "lagged") {
+      log(`Fell behind the event stream; skipped ${event.dropped} events.`);
     } else if (event.type === "phase") {
       if (!connected) {
         connected = true;
@@ -421,20 +423,50 @@ async function waitForEvents() {
     }
   };
 
+  const handleMessage = (event) => {
+    if (event.type === "batch" && Array.isArray(event.events)) {
+      for (const inner of event.events) {
+        handleEvent(inner);
+        if (done) {
+          break;
+        }
+      }
+    } else {
+      handleEvent(event);
+    }
+  };
+
+  if (typeof EventSource !== "undefined") {
+    // One persistent stream for the whole session; EventSource reconnects on its own.
+    await new Promise((resolve) => {
+      const source = new EventSource("/events");
+      source.onmessage = (message) => {
+        handleMessage(JSON.parse(message.data));
+        if (done) {
+          source.close();
+          resolve();
+        }
+      };
+      source.onerror = () => {
+        if (!done) {
+          log("Event stream interrupted. Reconnecting...");
+        }
+      };
+    });
+    return;
+  }
+
+  // Long-poll fallback for browsers without EventSource. Passing back the cursor from each
+  // response means events broadcast between polls are still delivered.
+  let since = null;
   while (!done) {
     try {
-      const resp = await fetch("/next-event");
+      const resp = await fetch(since === null ? "/next-event" : `/next-event?since=${since}`);
       const event = await resp.json();
-      if (event.type === "batch" && Array.isArray(event.events)) {
-        for (const inner of event.events) {
-          handleEvent(inner);
-          if (done) {
-            break;
-          }
-        }
-      } else {
-        handleEvent(event);
+      if (typeof event.seq === "number") {
+        since = event.seq;
       }
+      handleMessage(event);
     } catch (error) {
       log(`Event fetch error: ${error}. Retrying...`);
       await new Promise((resolve) => setTimeout(resolve, 500));
@@ -1,6 +1,14 @@
 from __future__ import annotations
 
-from neurostasis.eeg import ConcentrationMetric
+import threading
+from dataclasses import astuple
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from neurostasis import eeg
+from neurostasis.eeg import AlphaThetaMetricSink, ConcentrationMetric
 from neurostasis.eeg.attention import AttentionState, latest_attention_states
 
 
@@ -11,6 +19,12 @@ class _FakeRunner:
     def metric_history(self) -> list[ConcentrationMetric]:
         return list(self._metrics)
 
+    def metric_history_arrays(self, count: int | None = None) -> np.ndarray:
+        rows = [astuple(m) for m in self._metrics]
+        if count is not None:
+            rows = rows[-count:]
+        return np.array(rows, dtype=np.float64).reshape(-1, 5).T
+
 
 def _metric(ts: float, alpha: float, theta: float, ratio: float, score: float) -> ConcentrationMetric:
     return ConcentrationMetric(
@@ -49,3 +63,182 @@ def test_latest_attention_states_handles_empty_and_bad_count() -> None:
         assert False, "Expected ValueError for count=0"
     except ValueError:
         pass
+
+
+class _FakeINode:
+    def setup(self, data: dict, port_context_in: dict) -> dict:
+        return {}
+
+    def stop(self) -> None:
+        pass
+
+
+class _FakeFFT(_FakeINode):
+    def __init__(self, **kwargs) -> None:
+        self.config = kwargs
+        self._steps = 0
+
+    def is_decimation_step(self) -> bool:
+        # gp.FFT emits once every window_size * (1 - overlap) single-sample steps.
+        self._steps += 1
+        hop = max(1, round(self.config["window_size"] * (1.0 - self.config["overlap"])))
+        return self._steps % hop == 0
+
+
+class _FakeGpype:
+    INode = _FakeINode
+    FFT = _FakeFFT
+    MovingAverage = _FakeFFT
+
+    class Constants:
+        class Keys:
+            SAMPLING_RATE = "sampling_rate"
+            FRAME_SIZE = "frame_size"
+
+        class Defaults:
+            PORT_OUT = "out"
+
+
+def _setup_sink(monkeypatch, metrics_csv_path: Path | None = None) -> tuple[AlphaThetaMetricSink, object]:
+    monkeypatch.setattr(eeg, "_require_gpype", lambda: _FakeGpype)
+    sink = AlphaThetaMetricSink(
+        alpha_low_hz=8.0,
+        alpha_high_hz=12.0,
+        theta_low_hz=4.0,
+        theta_high_hz=8.0,
+        ratio_low=0.6,
+        ratio_high=2.4,
+        print_interval_s=3600.0,
+        history_size=16,
+        metrics_csv_path=metrics_csv_path,
+    )
+    node = sink.build_node()
+    node.setup({}, {"in": {"sampling_rate": 250.0, "frame_size": 250}})
+    return sink, node
+
+
+def test_metric_sink_band_powers_and_score(monkeypatch) -> None:
+    sink, node = _setup_sink(monkeypatch)
+    block = np.zeros((126, 2), dtype=np.float32)
+    block[4:8, :] = 1.0
+    block[8:12, :] = np.sqrt(1.5)
+    block[12:30, :] = 5.0
+
+    node.step({"in": block})
+
+    metric = sink.latest()
+    assert metric is not None
+    assert metric.alpha_power == pytest.approx(1.5, rel=1e-5)
+    assert metric.theta_power == pytest.approx(1.0, rel=1e-5)
+    assert metric.alpha_theta_ratio == pytest.approx(1.5, rel=1e-5)
+    assert metric.concentration_score == pytest.approx(50.0, rel=1e-4)
+    assert sink.history() == [metric]
+
+
+def test_band_power_loop_kernel_matches_numpy_fallback() -> None:
+    rng = np.random.default_rng(0)
+    amplitude = rng.random((126, 3)).astype(np.float32)
+
+    expected = eeg._band_powers_numpy(amplitude, 8, 12, 4, 8)
+    assert eeg._band_powers_loop(amplitude, 8, 12, 4, 8) == pytest.approx(expected, rel=1e-5)
+    assert eeg._compute_bands(amplitude, 8, 12, 4, 8) == pytest.approx(expected, rel=1e-5)
+
+
+def test_metric_sink_writes_buffered_rows_on_stop(monkeypatch, tmp_path: Path) -> None:
+    csv_path = tmp_path / "metrics.csv"
+    sink, node = _setup_sink(monkeypatch, metrics_csv_path=csv_path)
+    block = np.ones((126, 2), dtype=np.float32)
+
+    for _ in range(3):
+        node.step({"in": block})
+    node.stop()
+
+    lines = csv_path.read_text(encoding="utf-8").splitlines()
+    assert lines[0].startswith("timestamp_unix_seconds,alpha_power")
+    assert len(lines) == 4
+    assert len(sink.history()) == 3
+
+
+def test_metric_sink_history_wraps_oldest_first(monkeypatch) -> None:
+    sink, _ = _setup_sink(monkeypatch)
+    for i in range(20):
+        sink._append(_metric(float(i), 1.0, 1.0, 1.0, float(i)))
+
+    history = sink.history()
+    arrays = sink.history_arrays(3)
+
+    assert len(history) == 16
+    assert [m.timestamp_unix_seconds for m in history] == [float(i) for i in range(4, 20)]
+    assert sink.latest() == _metric(19.0, 1.0, 1.0, 1.0, 19.0)
+    assert arrays.shape == (5, 3)
+    assert arrays[0].tolist() == [17.0, 18.0, 19.0]
+
+
+def test_metric_sink_wait_for_metric_wakes_on_append(monkeypatch) -> None:
+    sink, _ = _setup_sink(monkeypatch)
+
+    assert sink.wait_for_metric(0, timeout=0.01) == 0
+    assert sink.metric_count() == 0
+
+    producer = threading.Timer(0.05, sink._append, args=(_metric(1.0, 1.0, 1.0, 1.0, 1.0),))
+    producer.start()
+    assert sink.wait_for_metric(0, timeout=5.0) == 1
+    producer.join()
+    assert sink.metric_count() == 1
+
+
+def test_fft_node_matches_windowed_rfft_of_latest_samples() -> None:
+    signal = pytest.importorskip("scipy.signal")
+    rng = np.random.default_rng(0)
+    samples = rng.standard_normal((375, 3)).astype(np.float32)
+    node = eeg._build_fft_node(_FakeGpype, window_size=250, overlap=0.5, window_function="hamming")
+    node.setup({}, {"in": {}})
+
+    outputs = [node.step({"in": samples[i : i + 1]}) for i in range(len(samples))]
+    emitted = [out["out"] for out in outputs if out is not None]
+
+    # gp.FFT: amplitude = |rfft(x * w / sum(w))| * scale * 2, with scale 2 except at DC and Nyquist.
+    weights = signal.get_window("hamming", 250)
+    scale = np.full(126, 2.0)
+    scale[[0, -1]] = 1.0
+    magnitude = np.abs(np.fft.rfft(samples[125:375] * (weights / weights.sum())[:, None], axis=0))
+    expected = magnitude * scale[:, None] * 2
+    assert len(emitted) == 3
+    assert emitted[-1].shape == (126, 3)
+    np.testing.assert_allclose(emitted[-1], expected, rtol=1e-4, atol=1e-6)
+
+
+def test_moving_average_node_matches_zero_state_boxcar_filter() -> None:
+    signal = pytest.importorskip("scipy.signal")
+    rng = np.random.default_rng(1)
+    samples = rng.standard_normal((300, 2)).astype(np.float32)
+
+    for window_size in (125, 1):
+        node = eeg._build_moving_average_node(_FakeGpype, window_size=window_size)
+        node.setup({}, {"in": {}})
+        outputs = np.concatenate(
+            [node.step({"in": samples[i : i + 7]})["out"] for i in range(0, len(samples), 7)]
+        )
+
+        expected = signal.lfilter(np.full(window_size, 1.0 / window_size), [1.0], samples, axis=0)
+        assert outputs.dtype == np.float32
+        np.testing.assert_allclose(outputs, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_metric_sink_rejects_empty_bands(monkeypatch) -> None:
+    monkeypatch.setattr(eeg, "_require_gpype", lambda: _FakeGpype)
+    sink = AlphaThetaMetricSink(
+        alpha_low_hz=9.0,
+        alpha_high_hz=9.5,
+        theta_low_hz=4.0,
+        theta_high_hz=8.0,
+        ratio_low=0.6,
+        ratio_high=2.4,
+        print_interval_s=1.0,
+        history_size=16,
+        metrics_csv_path=None,
+    )
+    node = sink.build_node()
+
+    with pytest.raises(ValueError):
+        node.setup({}, {"in": {"sampling_rate": 250.0, "frame_size": 125}})
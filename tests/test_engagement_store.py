@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from neurostasis import engagement_store
+
+
+@pytest.fixture
+def store_dir(monkeypatch, tmp_path: Path) -> Path:
+    monkeypatch.setattr(engagement_store, "_state", engagement_store._StoreState.in_dir(tmp_path))
+    return tmp_path
+
+
+def test_append_engagement_record_computes_ema(store_dir: Path) -> None:
+    first = engagement_store.append_engagement_record({"session_score": 80.0}, alpha=0.5)
+    second = engagement_store.append_engagement_record({"session_score": 40.0}, alpha=0.5)
+    clamped = engagement_store.append_engagement_record({"session_score": 250.0}, alpha=0.5)
+
+    assert first["ema_score"] == 80.0
+    assert second["ema_score"] == 60.0
+    assert clamped["session_score"] == 100.0
+    assert clamped["ema_score"] == 80.0
+
+    history = engagement_store.get_engagement_history(limit=2)
+    assert [r["session_score"] for r in history] == [40.0, 100.0]
+
+
+def test_get_engagement_history_picks_up_external_changes(store_dir: Path) -> None:
+    assert engagement_store.get_engagement_history() == []
+
+    engagement_store.append_engagement_record({"session_score": 10.0})
+    (store_dir / "engagement_scores.ndjson").unlink()
+    store_path = store_dir / "engagement_scores.json"
+    store_path.write_text(json.dumps([{"session_score": 1.0, "ema_score": 1.0}, "junk"]), encoding="utf-8")
+
+    assert engagement_store.get_engagement_history() == [{"session_score": 1.0, "ema_score": 1.0}]
+
+
+def test_appends_go_to_log_until_compaction(monkeypatch, store_dir: Path) -> None:
+    monkeypatch.setattr(engagement_store, "_COMPACT_EVERY", 2)
+
+    for score in (10.0, 20.0, 30.0):
+        engagement_store.append_engagement_record({"session_score": score})
+
+    snapshot = json.loads((store_dir / "engagement_scores.json").read_text(encoding="utf-8"))
+    log_lines = (store_dir / "engagement_scores.ndjson").read_text(encoding="utf-8").splitlines()
+    assert [r["session_score"] for r in snapshot] == [10.0, 20.0]
+    assert [json.loads(line)["session_score"] for line in log_lines] == [30.0]
+
+    engagement_store._state.cache = None
+    history = engagement_store.get_engagement_history()
+    assert [r["session_score"] for r in history] == [10.0, 20.0, 30.0]
+
+
+@pytest.mark.parametrize(
+    ("method", "name"),
+    [
+        ("replace", "engagement_scores.ndjson"),
+        ("replace", "engagement_scores.tmp"),
+        ("unlink", "engagement_scores.ndjson.compacting"),
+    ],
+)
+def test_interrupted_compaction_keeps_each_record_once(monkeypatch, store_dir: Path, method: str, name: str) -> None:
+    monkeypatch.setattr(engagement_store, "_COMPACT_EVERY", 2)
+    engagement_store.append_engagement_record({"session_score": 10.0})
+
+    real = getattr(Path, method)
+
+    def _crash(self, *args, **kwargs):
+        if self.name == name:
+            raise OSError("simulated crash")
+        return real(self, *args, **kwargs)
+
+    with monkeypatch.context() as m:
+        m.setattr(Path, method, _crash)
+        with pytest.raises(OSError):
+            engagement_store.append_engagement_record({"session_score": 20.0})
+
+    monkeypatch.setattr(engagement_store, "_state", engagement_store._StoreState.in_dir(store_dir))
+    assert [r["session_score"] for r in engagement_store.get_engagement_history()] == [10.0, 20.0]
+    assert not (store_dir / "engagement_scores.ndjson.compacting").exists()
+
+    engagement_store.append_engagement_record({"session_score": 30.0})
+    assert [r["session_score"] for r in engagement_store.get_engagement_history()] == [10.0, 20.0, 30.0]
+
+
+def test_append_reads_previous_ema_from_sidecar(monkeypatch, store_dir: Path) -> None:
+    engagement_store.append_engagement_record({"session_score": 80.0}, alpha=0.5)
+    engagement_store._state.last_stamp = None
+    engagement_store._state.cache = None
+
+    def _fail() -> list:
+        raise AssertionError("store should not be parsed on append")
+
+    monkeypatch.setattr(engagement_store, "_parse_store_unlocked", _fail)
+    monkeypatch.setattr(engagement_store, "_parse_log_unlocked", _fail)
+    second = engagement_store.append_engagement_record({"session_score": 40.0}, alpha=0.5)
+
+    assert second["ema_score"] == 60.0
+
+
+def test_returned_records_do_not_alias_the_cache(store_dir: Path) -> None:
+    appended = engagement_store.append_engagement_record({"session_score": 50.0})
+    appended["session_score"] = -1.0
+    engagement_store.get_engagement_history()[0]["session_score"] = -2.0
+
+    assert engagement_store.get_engagement_history()[0]["session_score"] == 50.0
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from collections import deque, namedtuple
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from neurostasis import pupil
+
+
+@pytest.fixture
+def event_log(monkeypatch) -> None:
+    monkeypatch.setattr(pupil, "_event_log", deque(maxlen=4))
+    monkeypatch.setattr(pupil, "_event_seq", 0)
+    monkeypatch.setattr(pupil, "_event_waiters", set())
+
+
+def test_events_after_returns_unseen_events_in_order(event_log) -> None:
+    for i in range(3):
+        pupil._broadcast({"type": "log", "msg": str(i)})
+
+    seq, events = pupil._events_after(1, timeout=0.0)
+    assert seq == 3
+    assert [json.loads(e)["msg"] for e in events] == ["1", "2"]
+
+    seq, events = pupil._events_after(0, timeout=0.0, limit=2)
+    assert seq == 2
+    assert [json.loads(e)["msg"] for e in events] == ["0", "1"]
+
+    assert pupil._events_after(3, timeout=0.01) == (3, [])
+
+
+def test_wait_events_wakes_on_broadcast_from_another_thread(event_log) -> None:
+    async def wait() -> tuple[int, list[bytes]]:
+        threading.Timer(0.05, pupil._broadcast, args=({"type": "log", "msg": "x"},)).start()
+        return await pupil._wait_events(0, timeout=5.0)
+
+    seq, events = asyncio.run(wait())
+    assert seq == 1
+    assert [json.loads(e)["msg"] for e in events] == ["x"]
+    assert asyncio.run(pupil._wait_events(1, timeout=0.01)) == (1, [])
+    assert not pupil._event_waiters
+
+
+def test_next_event_keeps_bare_single_events_without_a_cursor(event_log) -> None:
+    async def poll(since=None) -> dict:
+        if since is None:
+            threading.Timer(0.05, pupil._broadcast, args=({"type": "log", "msg": "x"},)).start()
+        return json.loads((await pupil.next_event(since)).body)
+
+    assert asyncio.run(poll()) == {"type": "log", "msg": "x", "seq": 1}
+    assert asyncio.run(poll(0)) == {"type": "batch", "seq": 1, "events": [{"type": "log", "msg": "x"}]}
+
+
+def test_events_after_skips_events_evicted_from_the_log(event_log) -> None:
+    for i in range(6):
+        pupil._broadcast({"type": "log", "msg": str(i)})
+
+    seq, events = pupil._events_after(0, timeout=0.0)
+    lagged, *rest = [json.loads(e) for e in events]
+    assert seq == 6
+    assert lagged == {"type": "lagged", "dropped": 2}
+    assert [e["msg"] for e in rest] == ["2", "3", "4", "5"]
+
+
+def test_window_stats_accumulate_only_samples_inside_the_window() -> None:
+    window = pupil._WindowStats(1.0, 2.0)
+    for elapsed, value in ((0.5, 9.0), (1.0, 4.0), (1.5, None), (2.0, 6.0), (2.5, 1.0)):
+        window.add(elapsed, value)
+
+    assert window.samples == 3
+    assert window.mean == 5.0
+    assert window.minimum == 4.0
+    assert pupil._WindowStats(0.0, 1.0).mean is None
+
+
+def test_resume_cursor_falls_back_to_now_for_unknown_cursors(event_log) -> None:
+    for i in range(3):
+        pupil._broadcast({"type": "log", "msg": str(i)})
+
+    assert pupil._resume_cursor(1) == 1
+    assert pupil._resume_cursor(None) == 3
+    assert pupil._resume_cursor(7) == 3
+    assert pupil._resume_cursor(-1) == 3
+
+
+def test_normalize_sequence_rescales_only_out_of_range_traces() -> None:
+    inside = [(0.1, 0.2), (0.9, 0.4)]
+    np.testing.assert_array_equal(pupil._normalize_sequence(inside), inside)
+
+    scaled = pupil._normalize_sequence([(100.0, 5.0), (300.0, 5.0), (200.0, 5.0)])
+    np.testing.assert_allclose(scaled, [(0.0, 0.0), (1.0, 0.0), (0.5, 0.0)])
+    assert pupil._normalize_sequence([]).shape == (0, 2)
+
+
+def test_gaze_reader_fills_missing_fields_with_none() -> None:
+    full = SimpleNamespace(pupil_diameter_left=3.0, pupil_diameter_right=3.2, x=0.1, y=0.2, worn=True)
+    assert pupil._gaze_reader(full)(full) == (3.0, 3.2, 0.1, 0.2, True)
+
+    plain = SimpleNamespace(x=0.1, y=0.2, worn=False)
+    assert pupil._gaze_reader(plain)(plain) == (None, None, 0.1, 0.2, False)
+
+    # Same type as `full`, so the reader built for it must tolerate the missing fields too.
+    assert pupil._gaze_reader(full)(plain) == (None, None, 0.1, 0.2, False)
+
+    gaze_data = namedtuple("GazeData", ("x", "y", "worn", "pupil_diameter_left", "pupil_diameter_right"))
+    datum = gaze_data(0.1, 0.2, True, 3.0, 3.2)
+    assert pupil._gaze_reader(datum)(datum) == (3.0, 3.2, 0.1, 0.2, True)
+
+
+def test_root_serves_current_index_with_validators(monkeypatch, tmp_path) -> None:
+    from starlette.requests import Request
+
+    def get(**headers: str):
+        scope = {"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode()) for k, v in headers.items()]}
+        return pupil.root(Request(scope))
+
+    monkeypatch.setattr(pupil, "WEB_DIR", tmp_path)
+    monkeypatch.setattr(pupil, "_index_cache", None)
+    index = tmp_path / "index.html"
+    index.write_text("<p>one</p>", encoding="utf-8")
+
+    plain = get(accept_encoding="gzip;q=0, deflate")
+    assert plain.body == b"<p>one</p>" and "content-encoding" not in plain.headers
+    assert get(accept_encoding="br, gzip;q=0.5").headers["content-encoding"] == "gzip"
+    assert get(if_none_match=plain.headers["etag"]).status_code == 304
+
+    index.write_text("<p>second</p>", encoding="utf-8")
+    assert get().body == b"<p>second</p>"